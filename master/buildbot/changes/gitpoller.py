@@ -32,6 +32,27 @@ from buildbot.util.git import getSshKnownHostsContents
 from buildbot.util.misc import writeLocalFile
 from buildbot.util.state import StateMixin
 
+# NUL-separated commit timestamp, author, committer and comments, as parsed by
+# GitPoller._get_commit_info
+_COMMIT_INFO_FORMAT = '%ct%x00%aN <%aE>%x00%cN <%cE>%x00%s%n%b%x00'
+
+# the same fields preceded by the commit hash, one record per commit of a git log -z
+# --name-only walk; the leading NUL tells the next record apart from the file names
+_COMMIT_RECORD_FORMAT = f'%x00%H%x00{_COMMIT_INFO_FORMAT}'
+_COMMIT_RECORD_RE = re.compile(
+    r'\x00([0-9a-f]{40}|[0-9a-f]{64})\x00'
+    r'([^\x00]*)\x00([^\x00]*)\x00([^\x00]*)\x00([^\x00]*)\x00\x00'
+    r'\n?((?:[^\x00]+\x00)*)'
+)
+
+# "<sha>\t<ref>" lines of git ls-remote; the sha length depends on the object format
+_LS_REMOTE_REF_RE = re.compile(r'^([0-9a-f]+)\t(\S+)', re.MULTILINE)
+
+
+def _parse_ls_remote(output):
+    """Return the {ref: revision} mapping listed by git ls-remote."""
+    return {ref: rev for rev, ref in _LS_REMOTE_REF_RE.findall(output)}
+
 
 class GitError(Exception):
     """Raised when git exits with code 128."""
@@ -166,6 +187,8 @@ class GitPoller(base.ReconfigurablePollingChangeSource, StateMixin, GitMixin):
                 branches = ['master']
 
         self.repourl = repourl
+        # computed once here, it is part of every tracker branch name
+        self._tracker_branch_prefix = f"refs/buildbot/{urlquote(repourl, '').replace('~', '%7E')}"
         self.branches = branches
         self.encoding = encoding
         self.buildPushesWithNoCommits = buildPushesWithNoCommits
@@ -182,6 +205,7 @@ class GitPoller(base.ReconfigurablePollingChangeSource, StateMixin, GitMixin):
         self.sshHostKey = sshHostKey
         self.sshKnownHosts = sshKnownHosts
         self.setupGit(logname='GitPoller')
+        self._gitFeaturesChecked = False
 
         if self.workdir is None:
             self.workdir = 'gitpoller-work'
@@ -202,6 +226,11 @@ class GitPoller(base.ReconfigurablePollingChangeSource, StateMixin, GitMixin):
 
     @defer.inlineCallbacks
     def _checkGitFeatures(self):
+        # the features of the git binary don't change while the master is running, so they are
+        # only checked until the check succeeds once after each reconfiguration
+        if self._gitFeaturesChecked:
+            return
+
         stdout = yield self._dovccmd('--version', [])
 
         self.parseGitFeatures(stdout)
@@ -211,6 +240,11 @@ class GitPoller(base.ReconfigurablePollingChangeSource, StateMixin, GitMixin):
         if self.sshPrivateKey is not None and not self.supportsSshPrivateKeyAsEnvOption:
             raise EnvironmentError('SSH private keys require Git 2.3.0 or newer')
 
+        self._gitFeaturesChecked = True
+
+    def _isRepositoryInitialized(self):
+        return os.path.exists(os.path.join(self.workdir, 'HEAD'))
+
     @defer.inlineCallbacks
     def activate(self):
         try:
@@ -237,21 +271,25 @@ class GitPoller(base.ReconfigurablePollingChangeSource, StateMixin, GitMixin):
         return str
 
     def _getBranches(self):
-        d = self._dovccmd('ls-remote', ['--refs', self.repourl])
-
-        @d.addCallback
-        def parseRemote(rows):
-            branches = []
-            for row in rows.splitlines():
-                if '\t' not in row:
-                    # Not a useful line
-                    continue
-                _, ref = row.split("\t")
-                branches.append(ref)
-            return branches
-
+        args = ['--refs']
+        if self.branches is True:
+            # only branches are polled, let the server filter the other refs out
+            args.append('--heads')
+        d = self._dovccmd('ls-remote', [*args, self.repourl])
+        d.addCallback(_parse_ls_remote)
         return d
 
+    def _remoteBranchesUnchanged(self, branches, remote_refs):
+        """Return True if the remote tips of exactly the branches known from the previous poll
+        are still the revisions recorded in lastRev."""
+        if not self.lastRev or set(self.lastRev) != set(branches):
+            return False
+        for branch, rev in self.lastRev.items():
+            remote_rev = remote_refs.get(branch, remote_refs.get(f'refs/heads/{branch}'))
+            if remote_rev != rev:
+                return False
+        return True
+
     def _headsFilter(self, branch):
         """Filter out remote references that don't begin with 'refs/heads'."""
         return branch.startswith("refs/heads/")
@@ -263,8 +301,28 @@ class GitPoller(base.ReconfigurablePollingChangeSource, StateMixin, GitMixin):
         return branch
 
     def _trackerBranch(self, branch):
-        url = urlquote(self.repourl, '').replace('~', '%7E')
-        return f"refs/buildbot/{url}/{self._removeHeads(branch)}"
+        return f"{self._tracker_branch_prefix}/{self._removeHeads(branch)}"
+
+    @defer.inlineCallbacks
+    def _getTrackerBranchRevs(self):
+        """Return the revisions of all tracker branches of the repository in a single git call."""
+        rows = yield self._dovccmd(
+            'for-each-ref',
+            ['--format=%(objectname) %(refname)', self._tracker_branch_prefix],
+            path=self.workdir,
+        )
+        revs = {}
+        for row in rows.splitlines():
+            rev, ref = row.split(' ', 1)
+            revs[ref] = rev
+        return revs
+
+    def _fetchArgs(self):
+        # tags are only fetched through the refspecs, and FETCH_HEAD is never read
+        args = ['--progress', '--no-tags']
+        if self.supportsNoWriteFetchHead:
+            args.append('--no-write-fetch-head')
+        return [*args, self.repourl]
 
     def poll_should_exit(self):
         # A single gitpoller loop may take a while on a loaded master, which would block
@@ -275,11 +333,12 @@ class GitPoller(base.ReconfigurablePollingChangeSource, StateMixin, GitMixin):
     def poll(self):
         yield self._checkGitFeatures()
 
-        try:
-            yield self._dovccmd('init', ['--bare', self.workdir])
-        except GitError as e:
-            log.msg(e.args[0])
-            return
+        if not self._isRepositoryInitialized():
+            try:
+                yield self._dovccmd('init', ['--bare', self.workdir])
+            except GitError as e:
+                log.msg(e.args[0])
+                return
 
         branches = self.branches if self.branches else []
         remote_refs = yield self._getBranches()
@@ -296,12 +355,23 @@ class GitPoller(base.ReconfigurablePollingChangeSource, StateMixin, GitMixin):
             remote_branches = [self._removeHeads(b) for b in remote_refs]
             branches = sorted(list(set(branches) & set(remote_branches)))
 
+        if self._remoteBranchesUnchanged(branches, remote_refs):
+            # nothing moved since the last poll, there is nothing to fetch
+            return
+
+        tracker_branches = {branch: self._trackerBranch(branch) for branch in branches}
         refspecs = [
-            f'+{self._removeHeads(branch)}:{self._trackerBranch(branch)}' for branch in branches
+            f'+{self._removeHeads(branch)}:{tracker_branches[branch]}' for branch in branches
         ]
 
         try:
-            yield self._dovccmd('fetch', ['--progress', self.repourl] + refspecs, path=self.workdir)
+            yield self._dovccmd('fetch', self._fetchArgs() + refspecs, path=self.workdir)
+        except GitError as e:
+            log.msg(e.args[0])
+            return
+
+        try:
+            tracker_revs = yield self._getTrackerBranchRevs()
         except GitError as e:
             log.msg(e.args[0])
             return
@@ -315,10 +385,10 @@ class GitPoller(base.ReconfigurablePollingChangeSource, StateMixin, GitMixin):
                     # we did process
                     break
 
-                rev = yield self._dovccmd(
-                    'rev-parse', [self._trackerBranch(branch)], path=self.workdir
-                )
-                revs[branch] = bytes2unicode(rev, self.encoding)
+                tracker_branch = tracker_branches[branch]
+                if tracker_branch not in tracker_revs:
+                    raise EnvironmentError(f'could not find the revision of {tracker_branch}')
+                revs[branch] = tracker_revs[tracker_branch]
                 yield self._process_changes(revs[branch], branch)
             except Exception:
                 log.err(_why=f"trying to poll branch {branch} of {self.repourl}")
@@ -331,46 +401,33 @@ class GitPoller(base.ReconfigurablePollingChangeSource, StateMixin, GitMixin):
         d = self._dovccmd('log', args, path=self.workdir)
         return d
 
+    def _parse_commit_timestamp(self, git_output):
+        if self.usetimestamps:
+            try:
+                stamp = int(git_output)
+            except Exception as e:
+                log.msg(
+                    f'gitpoller: caught exception converting output \'{git_output}\' to timestamp'
+                )
+                raise e
+            return stamp
+        return None
+
     def _get_commit_timestamp(self, rev):
         # unix timestamp
         args = ['--no-walk', r'--format=%ct', rev, '--']
         d = self._dovccmd('log', args, path=self.workdir)
-
-        @d.addCallback
-        def process(git_output):
-            if self.usetimestamps:
-                try:
-                    stamp = int(git_output)
-                except Exception as e:
-                    log.msg(
-                        f'gitpoller: caught exception converting output \'{git_output}\' to '
-                        'timestamp'
-                    )
-                    raise e
-                return stamp
-            return None
-
+        d.addCallback(self._parse_commit_timestamp)
         return d
 
     def _get_commit_files(self, rev):
-        args = ['--name-only', '--no-walk', r'--format=%n', rev, '--']
+        # with -z, file names are NUL-separated and never quoted
+        args = ['-z', '--name-only', '--no-walk', '--format=', rev, '--']
         d = self._dovccmd('log', args, path=self.workdir)
 
-        def decode_file(file):
-            # git use octal char sequences in quotes when non ASCII
-            match = re.match('^"(.*)"$', file)
-            if match:
-                file = bytes2unicode(
-                    match.groups()[0], encoding=self.encoding, errors='unicode_escape'
-                )
-            return bytes2unicode(file, encoding=self.encoding)
-
         @d.addCallback
         def process(git_output):
-            fileList = [
-                decode_file(file) for file in [s for s in git_output.splitlines() if len(s)]
-            ]
-            return fileList
+            return [file for file in git_output.split('\x00') if file]
 
         return d
 
@@ -394,92 +451,135 @@ class GitPoller(base.ReconfigurablePollingChangeSource, StateMixin, GitMixin):
             raise EnvironmentError('could not get commit committer for rev')
         return res
 
+    def _get_commit_info(self, rev):
+        """
+        Get the timestamp, author, committer, changed files and comments of a
+        commit with a single git invocation.
+        """
+        # -z makes git separate the file names with NUL characters and print
+        # them unquoted
+        args = ['--no-walk', '-z', '--name-only', f'--format={_COMMIT_INFO_FORMAT}', rev, '--']
+        d = self._dovccmd('log', args, path=self.workdir)
+
+        @d.addCallback
+        def process(git_output):
+            header, _, files = git_output.partition('\x00\x00')
+            fields = header.split('\x00')
+            if len(fields) != 4:
+                raise EnvironmentError(f'could not parse commit info for rev {rev}')
+            if files.startswith('\n'):
+                files = files[1:]
+            return self._make_commit_info(*fields, files)
+
+        return d
+
+    def _make_commit_info(self, timestamp, author, committer, comments, files):
+        return {
+            'timestamp': self._parse_commit_timestamp(timestamp),
+            'author': author,
+            'committer': committer,
+            'files': [f for f in files.split('\x00') if f],
+            'comments': comments.strip(),
+        }
+
+    def _get_commit_batch(self, newRev):
+        """
+        Get the details of all the commits reachable from newRev but not from
+        any of the last known revisions with a single git invocation.
+
+        Returns a list of (revision, commit info) tuples, oldest commit first.
+        """
+        args = (
+            [
+                '--ignore-missing',
+                '--reverse',
+                '-z',
+                '--name-only',
+                f'--format={_COMMIT_RECORD_FORMAT}',
+                newRev,
+            ]
+            + ['^' + rev for rev in sorted(self.lastRev.values())]
+            + ['--']
+        )
+        d = self._dovccmd('log', args, path=self.workdir)
+
+        @d.addCallback
+        def process(git_output):
+            # the records must follow each other exactly; anything else means the
+            # output was not understood and commits could silently go missing
+            commits = []
+            pos = 0
+            while pos < len(git_output):
+                m = _COMMIT_RECORD_RE.match(git_output, pos)
+                if m is None:
+                    raise EnvironmentError(
+                        f'could not parse commit info at offset {pos} of the log for rev {newRev}'
+                    )
+                commits.append((m[1], self._make_commit_info(m[2], m[3], m[4], m[5], m[6])))
+                pos = m.end()
+            return commits
+
+        return d
+
     @defer.inlineCallbacks
     def _process_changes(self, newRev, branch):
         """
         Read changes since last change.
 
-        - Read list of commit hashes.
-        - Extract details from each commit.
-        - Add changes to database.
+        - Read the details of the new commits with a single git log.
+        - Add changes to database, oldest first.
         """
 
         # initial run, don't parse all history
         if not self.lastRev:
             return
 
-        # get the change list
-        revListArgs = (
-            ['--ignore-missing']
-            + ['--format=%H', f'{newRev}']
-            + ['^' + rev for rev in sorted(self.lastRev.values())]
-            + ['--']
-        )
         self.changeCount = 0
-        results = yield self._dovccmd('log', revListArgs, path=self.workdir)
-
-        # process oldest change first
-        revList = results.split()
-        revList.reverse()
-
-        if self.buildPushesWithNoCommits and not revList:
-            existingRev = self.lastRev.get(branch)
-            if existingRev != newRev:
-                revList = [newRev]
-                if existingRev is None:
-                    # This branch was completely unknown, rebuild
-                    log.msg(f'gitpoller: rebuilding {newRev} for new branch "{branch}"')
-                else:
-                    # This branch is known, but it now points to a different
-                    # commit than last time we saw it, rebuild.
-                    log.msg(f'gitpoller: rebuilding {newRev} for updated branch "{branch}"')
-
-        self.changeCount = len(revList)
+        existingRev = self.lastRev.get(branch)
+        commits = yield self._get_commit_batch(newRev)
         self.lastRev[branch] = newRev
 
-        if self.changeCount:
-            log.msg(
-                f'gitpoller: processing {self.changeCount} changes: {revList} from '
-                f'"{self.repourl}" branch "{branch}"'
-            )
+        branch_name = self._removeHeads(branch)
+        repository = bytes2unicode(self.repourl, encoding=self.encoding)
 
-        for rev in revList:
-            dl = defer.DeferredList(
-                [
-                    self._get_commit_timestamp(rev),
-                    self._get_commit_author(rev),
-                    self._get_commit_committer(rev),
-                    self._get_commit_files(rev),
-                    self._get_commit_comments(rev),
-                ],
-                consumeErrors=True,
-            )
-
-            results = yield dl
-
-            # check for failures
-            failures = [r[1] for r in results if not r[0]]
-            if failures:
-                for failure in failures:
-                    log.err(failure, f"while processing changes for {newRev} {branch}")
-                # just fail on the first error; they're probably all related!
-                failures[0].raiseException()
-
-            timestamp, author, committer, files, comments = [r[1] for r in results]
-
-            yield self.master.data.updates.addChange(
-                author=author,
-                committer=committer,
-                revision=bytes2unicode(rev, encoding=self.encoding),
-                files=files,
-                comments=comments,
-                when_timestamp=timestamp,
-                branch=bytes2unicode(self._removeHeads(branch)),
-                project=self.project,
-                repository=bytes2unicode(self.repourl, encoding=self.encoding),
-                category=self.category,
-                src='git',
+        if commits:
+            self.changeCount = len(commits)
+            log.msg(
+                f'gitpoller: processing {self.changeCount} changes: '
+                f'{[rev for rev, _ in commits]} from "{self.repourl}" branch "{branch}"'
             )
+            for rev, info in commits:
+                yield self._add_change(rev, info, branch_name, repository)
+        elif self.buildPushesWithNoCommits and existingRev != newRev:
+            if existingRev is None:
+                # This branch was completely unknown, rebuild
+                log.msg(f'gitpoller: rebuilding {newRev} for new branch "{branch}"')
+            else:
+                # This branch is known, but it now points to a different
+                # commit than last time we saw it, rebuild.
+                log.msg(f'gitpoller: rebuilding {newRev} for updated branch "{branch}"')
+            try:
+                info = yield self._get_commit_info(newRev)
+            except Exception:
+                log.err(None, f"while processing changes for {newRev} {branch}")
+                raise
+            yield self._add_change(newRev, info, branch_name, repository)
+            self.changeCount = 1
+
+    def _add_change(self, rev, info, branch_name, repository):
+        return self.master.data.updates.addChange(
+            author=info['author'],
+            committer=info['committer'],
+            revision=rev,
+            files=info['files'],
+            comments=info['comments'],
+            when_timestamp=info['timestamp'],
+            branch=branch_name,
+            project=self.project,
+            repository=repository,
+            category=self.category,
+            src='git',
+        )
 
     def _isSshPrivateKeyNeededForCommand(self, command):
         commandsThatNeedKey = [
@@ -544,8 +644,8 @@ class GitPoller(base.ReconfigurablePollingChangeSource, StateMixin, GitMixin):
             self.master.reactor, [self.gitbin] + full_args, path, env=full_env
         )
         (code, stdout, stderr) = res
-        stdout = bytes2unicode(stdout, self.encoding)
-        stderr = bytes2unicode(stderr, self.encoding)
+        stdout = stdout.decode(self.encoding)
+        stderr = stderr.decode(self.encoding)
         if code != 0:
             if code == 128:
                 raise GitError(
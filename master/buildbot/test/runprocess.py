@@ -13,6 +13,8 @@
 #
 # Copyright Buildbot Team Members
 
+from collections import deque
+
 from buildbot.test.steps import ExpectMasterShell
 from buildbot.test.steps import _check_env_is_expected
 from buildbot.util import runprocess
@@ -23,12 +25,12 @@ class MasterRunProcessMixin:
 
     def setup_master_run_process(self):
         self._master_run_process_patched = False
-        self._expected_master_commands = []
+        self._expected_master_commands = deque()
         self._master_run_process_expect_env = {}
 
     def assert_all_commands_ran(self):
         self.assertEqual(
-            self._expected_master_commands, [], "assert all expected commands were run"
+            list(self._expected_master_commands), [], "assert all expected commands were run"
         )
 
     def patched_run_process(
@@ -51,7 +53,7 @@ class MasterRunProcessMixin:
         if not self._expected_master_commands:
             self.fail(f"got command {command} when no further commands were expected")
 
-        expect = self._expected_master_commands.pop(0)
+        expect = self._expected_master_commands.popleft()
 
         rc, stdout, stderr = expect._check(self, command, workdir, env)
 
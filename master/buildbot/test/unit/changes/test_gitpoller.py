@@ -29,10 +29,33 @@ from buildbot.test.util import changesource
 from buildbot.test.util import config
 from buildbot.test.util import logging
 from buildbot.util import bytes2unicode
+from buildbot.util import private_tempdir
 from buildbot.util import unicode2bytes
 
-# Test that environment variables get propagated to subprocesses (See #2116)
-os.environ['TEST_THAT_ENVIRONMENT_GETS_PASSED_TO_SUBPROCESSES'] = 'TRUE'
+ENVIRON_2116_KEY = 'TEST_THAT_ENVIRONMENT_GETS_PASSED_TO_SUBPROCESSES'
+
+
+class TestParseLsRemote(unittest.TestCase):
+    def test_parse(self):
+        output = (
+            '4423cdbcbb89c14e50dd5f4152415afd686c5241\trefs/heads/master\n'
+            'warning: redirecting to https://example.com/repo.git/\n'
+            '9118f4ab71963d23d02d4bdc54876ac8bf05acf2\trefs/tags/v1.0\r\n'
+            '2f6c2a4c2d8c1e1ae5b9b59b3cd0a2a1d77d29d0be3b7d0cf44c3e7d0e2d7f1a\trefs/heads/sha256'
+        )
+        self.assertEqual(
+            gitpoller._parse_ls_remote(output),
+            {
+                'refs/heads/master': '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                'refs/tags/v1.0': '9118f4ab71963d23d02d4bdc54876ac8bf05acf2',
+                'refs/heads/sha256': (
+                    '2f6c2a4c2d8c1e1ae5b9b59b3cd0a2a1d77d29d0be3b7d0cf44c3e7d0e2d7f1a'
+                ),
+            },
+        )
+
+    def test_parse_empty(self):
+        self.assertEqual(gitpoller._parse_ls_remote(''), {})
 
 
 class TestGitPollerBase(
@@ -44,15 +67,39 @@ class TestGitPollerBase(
 ):
     REPOURL = 'git@example.com:~foo/baz.git'
     REPOURL_QUOTED = 'git%40example.com%3A%7Efoo%2Fbaz.git'
+    TRACKER_PREFIX = f'refs/buildbot/{REPOURL_QUOTED}'
+    REF_MASTER = f'{TRACKER_PREFIX}/master'
+    REF_RELEASE = f'{TRACKER_PREFIX}/release'
 
     POLLER_WORKDIR = os.path.join('basedir', 'gitpoller-work')
 
+    LOG_RECORDS_FORMAT = '--format=%x00%H%x00%ct%x00%aN <%aE>%x00%cN <%cE>%x00%s%n%b%x00'
+
+    def tracker_revs_output(self, revs):
+        return unicode2bytes(
+            ''.join(f'{rev} {self.TRACKER_PREFIX}/{branch}\n' for branch, rev in revs)
+        )
+
+    def commit_records_output(self, revs):
+        # the same commit details as TestGitPoller.patch_get_commit_info returns
+        return unicode2bytes(
+            ''.join(
+                f'\x00{rev}\x001273258009\x00by:{rev[:8]}\x00by:{rev[:8]}\x00hello!\n\x00\x00'
+                f'\n/etc/{rev[:3]}\x00'
+                for rev in revs
+            )
+        )
+
     def createPoller(self):
         # this is overridden in TestGitPollerWithSshPrivateKey
         return gitpoller.GitPoller(self.REPOURL)
 
     @defer.inlineCallbacks
     def setUp(self):
+        # Test that environment variables get propagated to subprocesses (See #2116)
+        os.environ[ENVIRON_2116_KEY] = 'TRUE'
+        self.addCleanup(os.environ.pop, ENVIRON_2116_KEY, None)
+
         self.setup_test_reactor()
         self.setup_master_run_process()
         yield self.setUpChangeSource()
@@ -69,46 +116,44 @@ class TestGitPollerBase(
 class TestGitPoller(TestGitPollerBase):
     dummyRevStr = '12345abcde'
 
+    def patch_get_commit_info(self):
+        def commit_info(rev):
+            return defer.succeed({
+                'timestamp': 1273258009,
+                'author': 'by:' + rev[:8],
+                'committer': 'by:' + rev[:8],
+                'files': ['/etc/' + rev[:3]],
+                'comments': 'hello!',
+            })
+
+        self.patch(self.poller, '_get_commit_info', commit_info)
+
     @defer.inlineCallbacks
     def _perform_git_output_test(
         self, methodToTest, args, desiredGoodOutput, desiredGoodResult, emptyRaisesException=True
     ):
+        # the commands for all the cases are queued at once: empty output, failing git and
+        # finally good output
         self.expect_commands(
             ExpectMasterShell(['git'] + args).workdir(self.POLLER_WORKDIR),
+            ExpectMasterShell(['git'] + args).workdir(self.POLLER_WORKDIR).exit(1),
+            ExpectMasterShell(['git'] + args)
+            .workdir(self.POLLER_WORKDIR)
+            .stdout(desiredGoodOutput),
         )
 
         # we should get an Exception with empty output from git
-        try:
+        if emptyRaisesException:
+            with self.assertRaises(Exception):
+                yield methodToTest(self.dummyRevStr)
+        else:
             yield methodToTest(self.dummyRevStr)
-            if emptyRaisesException:
-                self.fail("run_process should have failed on empty output")
-        except Exception as e:
-            if not emptyRaisesException:
-                import traceback
-
-                traceback.print_exc()
-                self.fail("run_process should NOT have failed on empty output: " + repr(e))
-
-        self.assert_all_commands_ran()
 
         # and the method shouldn't suppress any exceptions
-        self.expect_commands(
-            ExpectMasterShell(['git'] + args).workdir(self.POLLER_WORKDIR).exit(1),
-        )
-
-        try:
+        with self.assertRaises(Exception):
             yield methodToTest(self.dummyRevStr)
-            self.fail("run_process should have failed on stderr output")
-        except Exception:
-            pass
-
-        self.assert_all_commands_ran()
 
         # finally we should get what's expected from good output
-        self.expect_commands(
-            ExpectMasterShell(['git'] + args).workdir(self.POLLER_WORKDIR).stdout(desiredGoodOutput)
-        )
-
         r = yield methodToTest(self.dummyRevStr)
 
         self.assertEqual(r, desiredGoodResult)
@@ -151,31 +196,41 @@ class TestGitPoller(TestGitPollerBase):
             emptyRaisesException=False,
         )
 
+    @defer.inlineCallbacks
     def test_get_commit_comments(self):
         comments = ['this is a commit message\n\nthat is multiline', 'single line message', '']
-        return defer.DeferredList([
-            self._test_get_commit_comments(commentStr) for commentStr in comments
-        ])
+        for commentStr in comments:
+            yield self._test_get_commit_comments(commentStr)
 
     def test_get_commit_files(self):
-        filesBytes = b'\n\nfile1\nfile2\n"\146ile_octal"\nfile space'
+        filesBytes = b'file1\x00file2\x00file_octal\x00file space\x00'
         filesRes = ['file1', 'file2', 'file_octal', 'file space']
         return self._perform_git_output_test(
             self.poller._get_commit_files,
-            ['log', '--name-only', '--no-walk', '--format=%n', self.dummyRevStr, '--'],
+            ['log', '-z', '--name-only', '--no-walk', '--format=', self.dummyRevStr, '--'],
             filesBytes,
             filesRes,
             emptyRaisesException=False,
         )
 
     def test_get_commit_files_with_space_in_changed_files(self):
-        filesBytes = b'normal_directory/file1\ndirectory with space/file2'
+        filesBytes = b'normal_directory/file1\x00directory with space/file2\x00'
         filesStr = bytes2unicode(filesBytes)
         return self._perform_git_output_test(
             self.poller._get_commit_files,
-            ['log', '--name-only', '--no-walk', '--format=%n', self.dummyRevStr, '--'],
+            ['log', '-z', '--name-only', '--no-walk', '--format=', self.dummyRevStr, '--'],
             filesBytes,
-            [l for l in filesStr.splitlines() if l.strip()],
+            [l for l in filesStr.split('\x00') if l],
+            emptyRaisesException=False,
+        )
+
+    def test_get_commit_files_with_non_ascii(self):
+        filesBytes = b'\303\251t\303\251\x00tab\there\x00plain\x00'
+        return self._perform_git_output_test(
+            self.poller._get_commit_files,
+            ['log', '-z', '--name-only', '--no-walk', '--format=', self.dummyRevStr, '--'],
+            filesBytes,
+            ['\u00e9t\u00e9', 'tab\there', 'plain'],
             emptyRaisesException=False,
         )
 
@@ -189,6 +244,133 @@ class TestGitPoller(TestGitPollerBase):
             float(stampStr),
         )
 
+    def test_get_commit_info(self):
+        infoBytes = (
+            b'1273258009\x00'
+            b'Sammy Jankis <email@example.com>\x00'
+            b'Natalie <natalie@example.com>\x00'
+            b'this is a commit message\n\nthat is multiline\n\x00'
+            b'\x00\nfile1\x00directory with space/file2\x00"file_quoted"\x00'
+        )
+        return self._perform_git_output_test(
+            self.poller._get_commit_info,
+            [
+                'log',
+                '--no-walk',
+                '-z',
+                '--name-only',
+                '--format=%ct%x00%aN <%aE>%x00%cN <%cE>%x00%s%n%b%x00',
+                self.dummyRevStr,
+                '--',
+            ],
+            infoBytes,
+            {
+                'timestamp': 1273258009,
+                'author': 'Sammy Jankis <email@example.com>',
+                'committer': 'Natalie <natalie@example.com>',
+                'files': ['file1', 'directory with space/file2', '"file_quoted"'],
+                'comments': 'this is a commit message\n\nthat is multiline',
+            },
+        )
+
+    def test_get_commit_info_no_files(self):
+        infoBytes = (
+            b'1273258009\x00'
+            b'Sammy Jankis <email@example.com>\x00'
+            b'Sammy Jankis <email@example.com>\x00'
+            b'Merge branch\n\x00\x00'
+        )
+        return self._perform_git_output_test(
+            self.poller._get_commit_info,
+            [
+                'log',
+                '--no-walk',
+                '-z',
+                '--name-only',
+                '--format=%ct%x00%aN <%aE>%x00%cN <%cE>%x00%s%n%b%x00',
+                self.dummyRevStr,
+                '--',
+            ],
+            infoBytes,
+            {
+                'timestamp': 1273258009,
+                'author': 'Sammy Jankis <email@example.com>',
+                'committer': 'Sammy Jankis <email@example.com>',
+                'files': [],
+                'comments': 'Merge branch',
+            },
+        )
+
+    @defer.inlineCallbacks
+    def test_get_commit_batch(self):
+        self.expect_commands(
+            ExpectMasterShell([
+                'git',
+                'log',
+                '--ignore-missing',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
+                '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                '^fa3ae8ed68e664d4db24798611b352e3c6509930',
+                '--',
+            ])
+            .workdir(self.POLLER_WORKDIR)
+            .stdout(
+                b'\x004423cdbcbb89c14e50dd5f4152415afd686c5241\x001273258007\x00'
+                b'Sammy Jankis <email@example.com>\x00Natalie <natalie@example.com>\x00'
+                b'this is a commit message\n\nthat is multiline\n\x00'
+                b'\x00\nfile1\x00file\nwith newline\x00'
+                b'\x0064a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a\x001273258008\x00'
+                b'Sammy Jankis <email@example.com>\x00Sammy Jankis <email@example.com>\x00'
+                b'Merge branch\n\x00\x00'
+                b'\x009118f4ab71963d23d02d4bdc54876ac8bf05acf2\x001273258009\x00'
+                b'Sammy Jankis <email@example.com>\x00Sammy Jankis <email@example.com>\x00'
+                b'single line message\n\x00\x00\ndirectory with space/file2\x00'
+            ),
+        )
+
+        self.poller.lastRev = {'master': 'fa3ae8ed68e664d4db24798611b352e3c6509930'}
+        commits = yield self.poller._get_commit_batch('4423cdbcbb89c14e50dd5f4152415afd686c5241')
+
+        self.assert_all_commands_ran()
+        self.assertEqual(
+            commits,
+            [
+                (
+                    '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                    {
+                        'timestamp': 1273258007,
+                        'author': 'Sammy Jankis <email@example.com>',
+                        'committer': 'Natalie <natalie@example.com>',
+                        'files': ['file1', 'file\nwith newline'],
+                        'comments': 'this is a commit message\n\nthat is multiline',
+                    },
+                ),
+                (
+                    '64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
+                    {
+                        'timestamp': 1273258008,
+                        'author': 'Sammy Jankis <email@example.com>',
+                        'committer': 'Sammy Jankis <email@example.com>',
+                        'files': [],
+                        'comments': 'Merge branch',
+                    },
+                ),
+                (
+                    '9118f4ab71963d23d02d4bdc54876ac8bf05acf2',
+                    {
+                        'timestamp': 1273258009,
+                        'author': 'Sammy Jankis <email@example.com>',
+                        'committer': 'Sammy Jankis <email@example.com>',
+                        'files': ['directory with space/file2'],
+                        'comments': 'single line message',
+                    },
+                ),
+            ],
+        )
+
     def test_describe(self):
         self.assertSubstring("GitPoller", self.poller.describe())
 
@@ -231,16 +413,20 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5\n'),
+            .stdout(
+                self.tracker_revs_output([('master', 'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5')])
+            ),
         )
 
         self.poller.doPoll.running = True
@@ -256,6 +442,43 @@ class TestGitPoller(TestGitPollerBase):
             lastRev={'master': 'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5'},
         )
 
+    @defer.inlineCallbacks
+    def test_poll_initial_git_2_29(self):
+        self.expect_commands(
+            ExpectMasterShell(['git', '--version']).stdout(b'git version 2.29.0\n'),
+            ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
+            ExpectMasterShell(['git', 'ls-remote', '--refs', self.REPOURL]).stdout(
+                b'4423cdbcbb89c14e50dd5f4152415afd686c5241\trefs/heads/master\n'
+            ),
+            ExpectMasterShell([
+                'git',
+                'fetch',
+                '--progress',
+                '--no-tags',
+                '--no-write-fetch-head',
+                self.REPOURL,
+                f'+master:{self.REF_MASTER}',
+            ]).workdir(self.POLLER_WORKDIR),
+            ExpectMasterShell([
+                'git',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
+            ])
+            .workdir(self.POLLER_WORKDIR)
+            .stdout(
+                self.tracker_revs_output([('master', 'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5')])
+            ),
+        )
+
+        self.poller.doPoll.running = True
+        yield self.poller.poll()
+
+        self.assert_all_commands_ran()
+        self.assertEqual(
+            self.poller.lastRev, {'master': 'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5'}
+        )
+
     @defer.inlineCallbacks
     def test_poll_initial_poller_not_running(self):
         self.expect_commands(
@@ -272,6 +495,114 @@ class TestGitPoller(TestGitPollerBase):
         self.assert_all_commands_ran()
         self.assertEqual(self.poller.lastRev, {})
 
+    @defer.inlineCallbacks
+    def test_poll_git_features_cached(self):
+        self.expect_commands(
+            ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
+            ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
+            ExpectMasterShell(['git', 'ls-remote', '--refs', self.REPOURL]),
+            ExpectMasterShell([
+                'git',
+                'fetch',
+                '--progress',
+                '--no-tags',
+                self.REPOURL,
+                f'+master:{self.REF_MASTER}',
+            ]).workdir(self.POLLER_WORKDIR),
+            ExpectMasterShell([
+                'git',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
+            ])
+            .workdir(self.POLLER_WORKDIR)
+            .stdout(
+                self.tracker_revs_output([('master', 'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5')])
+            ),
+        )
+
+        self.poller.doPoll.running = True
+        yield self.poller.poll()
+        self.assert_all_commands_ran()
+
+        # git --version is not run again on the next poll
+        self.expect_commands(
+            ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
+            ExpectMasterShell(['git', 'ls-remote', '--refs', self.REPOURL]),
+            ExpectMasterShell([
+                'git',
+                'fetch',
+                '--progress',
+                '--no-tags',
+                self.REPOURL,
+                f'+master:{self.REF_MASTER}',
+            ]).workdir(self.POLLER_WORKDIR),
+            ExpectMasterShell([
+                'git',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
+            ])
+            .workdir(self.POLLER_WORKDIR)
+            .stdout(
+                self.tracker_revs_output([('master', 'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5')])
+            ),
+            ExpectMasterShell([
+                'git',
+                'log',
+                '--ignore-missing',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
+                'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5',
+                '^bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5',
+                '--',
+            ]).workdir(self.POLLER_WORKDIR),
+        )
+
+        yield self.poller.poll()
+        self.assert_all_commands_ran()
+
+    @defer.inlineCallbacks
+    def test_poll_initialized_workdir(self):
+        workdir = self.mktemp()
+        os.makedirs(workdir)
+        with open(os.path.join(workdir, 'HEAD'), 'w') as f:
+            f.write('ref: refs/heads/master\n')
+        self.poller.workdir = workdir
+
+        self.expect_commands(
+            ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
+            ExpectMasterShell(['git', 'ls-remote', '--refs', self.REPOURL]),
+            ExpectMasterShell([
+                'git',
+                'fetch',
+                '--progress',
+                '--no-tags',
+                self.REPOURL,
+                f'+master:{self.REF_MASTER}',
+            ]).workdir(workdir),
+            ExpectMasterShell([
+                'git',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
+            ])
+            .workdir(workdir)
+            .stdout(
+                self.tracker_revs_output([('master', 'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5')])
+            ),
+        )
+
+        self.poller.doPoll.running = True
+        yield self.poller.poll()
+
+        self.assert_all_commands_ran()
+        self.assertEqual(
+            self.poller.lastRev, {'master': 'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5'}
+        )
+
     def test_poll_failInit(self):
         self.expect_commands(
             ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
@@ -293,8 +624,9 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ])
             .workdir(self.POLLER_WORKDIR)
             .exit(1),
@@ -306,7 +638,7 @@ class TestGitPoller(TestGitPollerBase):
         return d
 
     @defer.inlineCallbacks
-    def test_poll_failRevParse(self):
+    def test_poll_failForEachRef(self):
         self.expect_commands(
             ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
             ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
@@ -317,23 +649,25 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
             .exit(1),
         )
 
         self.poller.doPoll.running = True
-        yield self.poller.poll()
+        with self.assertRaises(EnvironmentError):
+            yield self.poller.poll()
 
         self.assert_all_commands_ran()
-        self.assertEqual(len(self.flushLoggedErrors()), 1)
         self.assertEqual(self.poller.lastRev, {})
 
     @defer.inlineCallbacks
@@ -348,21 +682,28 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([('master', '4423cdbcbb89c14e50dd5f4152415afd686c5241')])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^fa3ae8ed68e664d4db24798611b352e3c6509930',
                 '--',
@@ -416,104 +757,216 @@ class TestGitPoller(TestGitPollerBase):
         self.patch(os, 'environ', {'ENVVAR': 'TRUE'})
         self.add_run_process_expect_env({'ENVVAR': 'TRUE'})
 
+        # the remote branch did not move, so nothing is fetched
         self.expect_commands(
             ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
             ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
             ExpectMasterShell(['git', 'ls-remote', '--refs', self.REPOURL]).stdout(
                 b'4423cdbcbb89c14e50dd5f4152415afd686c5241\trefs/heads/master\n'
             ),
+        )
+
+        self.poller.lastRev = {'master': '4423cdbcbb89c14e50dd5f4152415afd686c5241'}
+
+        self.poller.doPoll.running = True
+        yield self.poller.poll()
+
+        self.assert_all_commands_ran()
+        self.assertEqual(
+            self.poller.lastRev, {'master': '4423cdbcbb89c14e50dd5f4152415afd686c5241'}
+        )
+        self.assertEqual(self.master.data.updates.changesAdded, [])
+
+    @defer.inlineCallbacks
+    def test_poll_nothingNew_allBranches(self):
+        self.expect_commands(
+            ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
+            ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
+            ExpectMasterShell(['git', 'ls-remote', '--refs', '--heads', self.REPOURL]).stdout(
+                b'4423cdbcbb89c14e50dd5f4152415afd686c5241\trefs/heads/master\n'
+                b'9118f4ab71963d23d02d4bdc54876ac8bf05acf2\trefs/heads/release\n'
+            ),
+        )
+
+        self.poller.branches = True
+        self.poller.lastRev = {
+            'refs/heads/master': '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+            'refs/heads/release': '9118f4ab71963d23d02d4bdc54876ac8bf05acf2',
+        }
+
+        self.poller.doPoll.running = True
+        yield self.poller.poll()
+
+        self.assert_all_commands_ran()
+        self.assertEqual(self.master.data.updates.changesAdded, [])
+
+    @defer.inlineCallbacks
+    def test_poll_multipleBranches_initial(self):
+        self.expect_commands(
+            ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
+            ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
+            ExpectMasterShell(['git', 'ls-remote', '--refs', self.REPOURL]).stdout(
+                b'9118f4ab71963d23d02d4bdc54876ac8bf05acf2\t'
+                b'refs/heads/release\n'
+                b'4423cdbcbb89c14e50dd5f4152415afd686c5241\t'
+                b'refs/heads/master\n'
+            ),
             ExpectMasterShell([
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
-            ])
-            .workdir(self.POLLER_WORKDIR)
-            .stdout(b'no interesting output'),
+                f'+master:{self.REF_MASTER}',
+                f'+release:{self.REF_RELEASE}',
+            ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([
+                    ('master', '4423cdbcbb89c14e50dd5f4152415afd686c5241'),
+                    ('release', '9118f4ab71963d23d02d4bdc54876ac8bf05acf2'),
+                ])
+            ),
+        )
+
+        # do the poll
+        self.poller.branches = ['master', 'release', 'not_on_remote']
+        self.poller.doPoll.running = True
+        yield self.poller.poll()
+
+        self.assert_all_commands_ran()
+        self.assertEqual(
+            self.poller.lastRev,
+            {
+                'master': '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                'release': '9118f4ab71963d23d02d4bdc54876ac8bf05acf2',
+            },
+        )
+
+    @defer.inlineCallbacks
+    def test_poll_multipleBranches_missingTrackerBranch(self):
+        self.expect_commands(
+            ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
+            ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
+            ExpectMasterShell(['git', 'ls-remote', '--refs', self.REPOURL]).stdout(
+                b'9118f4ab71963d23d02d4bdc54876ac8bf05acf2\t'
+                b'refs/heads/release\n'
+                b'4423cdbcbb89c14e50dd5f4152415afd686c5241\t'
+                b'refs/heads/master\n'
+            ),
+            ExpectMasterShell([
+                'git',
+                'fetch',
+                '--progress',
+                '--no-tags',
+                self.REPOURL,
+                f'+master:{self.REF_MASTER}',
+                f'+release:{self.REF_RELEASE}',
+            ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'log',
-                '--ignore-missing',
-                '--format=%H',
-                '4423cdbcbb89c14e50dd5f4152415afd686c5241',
-                '^4423cdbcbb89c14e50dd5f4152415afd686c5241',
-                '--',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b''),
+            .stdout(
+                self.tracker_revs_output([('release', '9118f4ab71963d23d02d4bdc54876ac8bf05acf2')])
+            ),
         )
 
-        self.poller.lastRev = {'master': '4423cdbcbb89c14e50dd5f4152415afd686c5241'}
-
+        # do the poll
+        self.poller.branches = ['master', 'release']
         self.poller.doPoll.running = True
         yield self.poller.poll()
 
         self.assert_all_commands_ran()
-        self.master.db.state.assertStateByClass(
-            name=bytes2unicode(self.REPOURL),
-            class_name='GitPoller',
-            lastRev={'master': '4423cdbcbb89c14e50dd5f4152415afd686c5241'},
+        self.assertEqual(len(self.flushLoggedErrors()), 1)
+        self.assertEqual(
+            self.poller.lastRev, {'release': '9118f4ab71963d23d02d4bdc54876ac8bf05acf2'}
         )
 
     @defer.inlineCallbacks
-    def test_poll_multipleBranches_initial(self):
+    def check_poll_badCommitRecords(self, git_output):
         self.expect_commands(
             ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
             ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
             ExpectMasterShell(['git', 'ls-remote', '--refs', self.REPOURL]).stdout(
-                b'9118f4ab71963d23d02d4bdc54876ac8bf05acf2\t'
-                b'refs/heads/release\n'
-                b'4423cdbcbb89c14e50dd5f4152415afd686c5241\t'
-                b'refs/heads/master\n'
+                b'4423cdbcbb89c14e50dd5f4152415afd686c5241\trefs/heads/master\n'
             ),
             ExpectMasterShell([
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
-                '+release:refs/buildbot/' + self.REPOURL_QUOTED + '/release',
+                f'+master:{self.REF_MASTER}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([('master', '4423cdbcbb89c14e50dd5f4152415afd686c5241')])
+            ),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/release',
+                'log',
+                '--ignore-missing',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
+                '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                '^fa3ae8ed68e664d4db24798611b352e3c6509930',
+                '--',
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'9118f4ab71963d23d02d4bdc54876ac8bf05acf2'),
+            .stdout(git_output),
         )
 
         # do the poll
-        self.poller.branches = ['master', 'release', 'not_on_remote']
+        self.poller.lastRev = {'master': 'fa3ae8ed68e664d4db24798611b352e3c6509930'}
         self.poller.doPoll.running = True
         yield self.poller.poll()
 
         self.assert_all_commands_ran()
+        self.assertEqual(len(self.flushLoggedErrors(EnvironmentError)), 1)
+        # no change is added, neither from a misread record nor for a commit it hid
+        self.assertEqual(self.master.data.updates.changesAdded, [])
         self.assertEqual(
-            self.poller.lastRev,
-            {
-                'master': '4423cdbcbb89c14e50dd5f4152415afd686c5241',
-                'release': '9118f4ab71963d23d02d4bdc54876ac8bf05acf2',
-            },
+            self.poller.lastRev, {'master': '4423cdbcbb89c14e50dd5f4152415afd686c5241'}
+        )
+
+    def test_poll_truncatedCommitRecord(self):
+        return self.check_poll_badCommitRecords(
+            self.commit_records_output(['9118f4ab71963d23d02d4bdc54876ac8bf05acf2'])
+            # a commit without its committer field
+            + b'\x0064a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a\x001273258009\x00'
+            b'by:64a5dc2a\x00hello!\n\x00\x00\n/etc/64a\x00'
+            + self.commit_records_output(['4423cdbcbb89c14e50dd5f4152415afd686c5241'])
+        )
+
+    def test_poll_misseparatedCommitRecord(self):
+        return self.check_poll_badCommitRecords(
+            self.commit_records_output([
+                '9118f4ab71963d23d02d4bdc54876ac8bf05acf2',
+                '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+            ]).replace(b'\x00\x00\n', b'\x00\n')
         )
 
     @defer.inlineCallbacks
     def test_poll_multipleBranches(self):
+        self.setUpLogging()
         self.expect_commands(
             ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
             ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
@@ -527,22 +980,32 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
-                '+release:refs/buildbot/' + self.REPOURL_QUOTED + '/release',
+                f'+master:{self.REF_MASTER}',
+                f'+release:{self.REF_RELEASE}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([
+                    ('master', '4423cdbcbb89c14e50dd5f4152415afd686c5241'),
+                    ('release', '9118f4ab71963d23d02d4bdc54876ac8bf05acf2'),
+                ])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5',
                 '^fa3ae8ed68e664d4db24798611b352e3c6509930',
@@ -550,59 +1013,28 @@ class TestGitPoller(TestGitPollerBase):
             ])
             .workdir(self.POLLER_WORKDIR)
             .stdout(
-                b'\n'.join([
-                    b'64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
-                    b'4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                self.commit_records_output([
+                    '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                    '64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
                 ])
             ),
-            ExpectMasterShell([
-                'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/release',
-            ])
-            .workdir(self.POLLER_WORKDIR)
-            .stdout(b'9118f4ab71963d23d02d4bdc54876ac8bf05acf2'),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '9118f4ab71963d23d02d4bdc54876ac8bf05acf2',
                 '^4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5',
                 '--',
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'\n'.join([b'9118f4ab71963d23d02d4bdc54876ac8bf05acf2'])),
+            .stdout(self.commit_records_output(['9118f4ab71963d23d02d4bdc54876ac8bf05acf2'])),
         )
 
-        # and patch out the _get_commit_foo methods which were already tested
-        # above
-        def timestamp(rev):
-            return defer.succeed(1273258009)
-
-        self.patch(self.poller, '_get_commit_timestamp', timestamp)
-
-        def author(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_author', author)
-
-        def committer(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_committer', committer)
-
-        def files(rev):
-            return defer.succeed(['/etc/' + rev[:3]])
-
-        self.patch(self.poller, '_get_commit_files', files)
-
-        def comments(rev):
-            return defer.succeed('hello!')
-
-        self.patch(self.poller, '_get_commit_comments', comments)
-
         # do the poll
         self.poller.branches = ['master', 'release']
         self.poller.lastRev = {
@@ -613,6 +1045,10 @@ class TestGitPoller(TestGitPollerBase):
         yield self.poller.poll()
 
         self.assert_all_commands_ran()
+        self.assertLogged(
+            r"processing 2 changes: \['4423cdbcbb89c14e50dd5f4152415afd686c5241', "
+            r"'64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a'\]"
+        )
         self.assertEqual(
             self.poller.lastRev,
             {
@@ -687,21 +1123,28 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+release:refs/buildbot/' + self.REPOURL_QUOTED + '/release',
+                f'+release:{self.REF_RELEASE}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/release',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([('release', '4423cdbcbb89c14e50dd5f4152415afd686c5241')])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '--',
@@ -736,21 +1179,28 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+release:refs/buildbot/' + self.REPOURL_QUOTED + '/release',
+                f'+release:{self.REF_RELEASE}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/release',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([('release', '4423cdbcbb89c14e50dd5f4152415afd686c5241')])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '--',
@@ -759,32 +1209,9 @@ class TestGitPoller(TestGitPollerBase):
             .stdout(b''),
         )
 
-        # and patch out the _get_commit_foo methods which were already tested
+        # and patch out the _get_commit_info method which was already tested
         # above
-        def timestamp(rev):
-            return defer.succeed(1273258009)
-
-        self.patch(self.poller, '_get_commit_timestamp', timestamp)
-
-        def author(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_author', author)
-
-        def committer(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_committer', committer)
-
-        def files(rev):
-            return defer.succeed(['/etc/' + rev[:3]])
-
-        self.patch(self.poller, '_get_commit_files', files)
-
-        def comments(rev):
-            return defer.succeed('hello!')
-
-        self.patch(self.poller, '_get_commit_comments', comments)
+        self.patch_get_commit_info()
 
         # do the poll
         self.poller.branches = ['release']
@@ -834,21 +1261,28 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+release:refs/buildbot/' + self.REPOURL_QUOTED + '/release',
+                f'+release:{self.REF_RELEASE}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/release',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([('release', '4423cdbcbb89c14e50dd5f4152415afd686c5241')])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^0ba9d553b7217ab4bbad89ad56dc0332c7d57a8c',
                 '^4423cdbcbb89c14e50dd5f4152415afd686c5241',
@@ -858,32 +1292,9 @@ class TestGitPoller(TestGitPollerBase):
             .stdout(b''),
         )
 
-        # and patch out the _get_commit_foo methods which were already tested
+        # and patch out the _get_commit_info method which was already tested
         # above
-        def timestamp(rev):
-            return defer.succeed(1273258009)
-
-        self.patch(self.poller, '_get_commit_timestamp', timestamp)
-
-        def author(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_author', author)
-
-        def committer(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_committer', committer)
-
-        def files(rev):
-            return defer.succeed(['/etc/' + rev[:3]])
-
-        self.patch(self.poller, '_get_commit_files', files)
-
-        def comments(rev):
-            return defer.succeed('hello!')
-
-        self.patch(self.poller, '_get_commit_comments', comments)
+        self.patch_get_commit_info()
 
         # do the poll
         self.poller.branches = ['release']
@@ -934,21 +1345,28 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+release:refs/buildbot/' + self.REPOURL_QUOTED + '/release',
+                f'+release:{self.REF_RELEASE}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/release',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([('release', '4423cdbcbb89c14e50dd5f4152415afd686c5241')])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^0ba9d553b7217ab4bbad89ad56dc0332c7d57a8c',
                 '--',
@@ -957,32 +1375,9 @@ class TestGitPoller(TestGitPollerBase):
             .stdout(b''),
         )
 
-        # and patch out the _get_commit_foo methods which were already tested
+        # and patch out the _get_commit_info method which was already tested
         # above
-        def timestamp(rev):
-            return defer.succeed(1273258009)
-
-        self.patch(self.poller, '_get_commit_timestamp', timestamp)
-
-        def author(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_author', author)
-
-        def committer(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_committer', committer)
-
-        def files(rev):
-            return defer.succeed(['/etc/' + rev[:3]])
-
-        self.patch(self.poller, '_get_commit_files', files)
-
-        def comments(rev):
-            return defer.succeed('hello!')
-
-        self.patch(self.poller, '_get_commit_comments', comments)
+        self.patch_get_commit_info()
 
         # do the poll
         self.poller.branches = ['release']
@@ -1025,68 +1420,48 @@ class TestGitPoller(TestGitPollerBase):
         self.expect_commands(
             ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
             ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
-            ExpectMasterShell(['git', 'ls-remote', '--refs', self.REPOURL]).stdout(
+            ExpectMasterShell(['git', 'ls-remote', '--refs', '--heads', self.REPOURL]).stdout(
                 b'4423cdbcbb89c14e50dd5f4152415afd686c5241\trefs/heads/master\n'
             ),
             ExpectMasterShell([
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([('master', '4423cdbcbb89c14e50dd5f4152415afd686c5241')])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^fa3ae8ed68e664d4db24798611b352e3c6509930',
                 '--',
             ])
             .workdir(self.POLLER_WORKDIR)
             .stdout(
-                b'\n'.join([
-                    b'64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
-                    b'4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                self.commit_records_output([
+                    '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                    '64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
                 ])
             ),
         )
 
-        # and patch out the _get_commit_foo methods which were already tested
-        # above
-        def timestamp(rev):
-            return defer.succeed(1273258009)
-
-        self.patch(self.poller, '_get_commit_timestamp', timestamp)
-
-        def author(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_author', author)
-
-        def committer(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_committer', committer)
-
-        def files(rev):
-            return defer.succeed(['/etc/' + rev[:3]])
-
-        self.patch(self.poller, '_get_commit_files', files)
-
-        def comments(rev):
-            return defer.succeed('hello!')
-
-        self.patch(self.poller, '_get_commit_comments', comments)
-
         # do the poll
         self.poller.branches = True
         self.poller.lastRev = {
@@ -1128,6 +1503,7 @@ class TestGitPoller(TestGitPollerBase):
         self.patch(os, 'environ', {'ENVVAR': 'TRUE'})
         self.add_run_process_expect_env({'ENVVAR': 'TRUE'})
 
+        # the remote branch was reset to an ancestor of the last known revision
         self.expect_commands(
             ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
             ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
@@ -1138,32 +1514,39 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ])
             .workdir(self.POLLER_WORKDIR)
             .stdout(b'no interesting output'),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([('master', '4423cdbcbb89c14e50dd5f4152415afd686c5241')])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '4423cdbcbb89c14e50dd5f4152415afd686c5241',
-                '^4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                '^fa3ae8ed68e664d4db24798611b352e3c6509930',
                 '--',
             ])
             .workdir(self.POLLER_WORKDIR)
             .stdout(b''),
         )
 
-        self.poller.lastRev = {'master': '4423cdbcbb89c14e50dd5f4152415afd686c5241'}
+        self.poller.lastRev = {'master': 'fa3ae8ed68e664d4db24798611b352e3c6509930'}
         self.poller.doPoll.running = True
         yield self.poller.poll()
 
@@ -1171,13 +1554,19 @@ class TestGitPoller(TestGitPollerBase):
         self.assertEqual(
             self.poller.lastRev, {'master': '4423cdbcbb89c14e50dd5f4152415afd686c5241'}
         )
+        self.assertEqual(self.master.data.updates.changesAdded, [])
+        self.master.db.state.assertStateByClass(
+            name=bytes2unicode(self.REPOURL),
+            class_name='GitPoller',
+            lastRev={'master': '4423cdbcbb89c14e50dd5f4152415afd686c5241'},
+        )
 
     @defer.inlineCallbacks
     def test_poll_allBranches_multiple(self):
         self.expect_commands(
             ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
             ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
-            ExpectMasterShell(['git', 'ls-remote', '--refs', self.REPOURL]).stdout(
+            ExpectMasterShell(['git', 'ls-remote', '--refs', '--heads', self.REPOURL]).stdout(
                 b'\n'.join([
                     b'4423cdbcbb89c14e50dd5f4152415afd686c5241\trefs/heads/master',
                     b'9118f4ab71963d23d02d4bdc54876ac8bf05acf2\trefs/heads/release',
@@ -1187,22 +1576,32 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
-                '+release:refs/buildbot/' + self.REPOURL_QUOTED + '/release',
+                f'+master:{self.REF_MASTER}',
+                f'+release:{self.REF_RELEASE}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([
+                    ('master', '4423cdbcbb89c14e50dd5f4152415afd686c5241'),
+                    ('release', '9118f4ab71963d23d02d4bdc54876ac8bf05acf2'),
+                ])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5',
                 '^fa3ae8ed68e664d4db24798611b352e3c6509930',
@@ -1210,59 +1609,28 @@ class TestGitPoller(TestGitPollerBase):
             ])
             .workdir(self.POLLER_WORKDIR)
             .stdout(
-                b'\n'.join([
-                    b'64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
-                    b'4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                self.commit_records_output([
+                    '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                    '64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
                 ])
             ),
-            ExpectMasterShell([
-                'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/release',
-            ])
-            .workdir(self.POLLER_WORKDIR)
-            .stdout(b'9118f4ab71963d23d02d4bdc54876ac8bf05acf2'),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '9118f4ab71963d23d02d4bdc54876ac8bf05acf2',
                 '^4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5',
                 '--',
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'\n'.join([b'9118f4ab71963d23d02d4bdc54876ac8bf05acf2'])),
+            .stdout(self.commit_records_output(['9118f4ab71963d23d02d4bdc54876ac8bf05acf2'])),
         )
 
-        # and patch out the _get_commit_foo methods which were already tested
-        # above
-        def timestamp(rev):
-            return defer.succeed(1273258009)
-
-        self.patch(self.poller, '_get_commit_timestamp', timestamp)
-
-        def author(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_author', author)
-
-        def committer(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_committer', committer)
-
-        def files(rev):
-            return defer.succeed(['/etc/' + rev[:3]])
-
-        self.patch(self.poller, '_get_commit_files', files)
-
-        def comments(rev):
-            return defer.succeed('hello!')
-
-        self.patch(self.poller, '_get_commit_comments', comments)
-
         # do the poll
         self.poller.branches = True
         self.poller.lastRev = {
@@ -1321,21 +1689,28 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([('master', '4423cdbcbb89c14e50dd5f4152415afd686c5241')])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5',
                 '^fa3ae8ed68e664d4db24798611b352e3c6509930',
@@ -1343,40 +1718,13 @@ class TestGitPoller(TestGitPollerBase):
             ])
             .workdir(self.POLLER_WORKDIR)
             .stdout(
-                b'\n'.join([
-                    b'64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
-                    b'4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                self.commit_records_output([
+                    '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                    '64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
                 ])
             ),
         )
 
-        # and patch out the _get_commit_foo methods which were already tested
-        # above
-        def timestamp(rev):
-            return defer.succeed(1273258009)
-
-        self.patch(self.poller, '_get_commit_timestamp', timestamp)
-
-        def author(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_author', author)
-
-        def committer(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_committer', committer)
-
-        def files(rev):
-            return defer.succeed(['/etc/' + rev[:3]])
-
-        self.patch(self.poller, '_get_commit_files', files)
-
-        def comments(rev):
-            return defer.succeed('hello!')
-
-        self.patch(self.poller, '_get_commit_comments', comments)
-
         # do the poll
         class TestCallable:
             def __call__(self, branch):
@@ -1431,57 +1779,39 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+refs/pull/410/head:refs/buildbot/' + self.REPOURL_QUOTED + '/refs/pull/410/head',
+                f'+refs/pull/410/head:{self.TRACKER_PREFIX}/refs/pull/410/head',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/refs/pull/410/head',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'9118f4ab71963d23d02d4bdc54876ac8bf05acf2'),
+            .stdout(
+                self.tracker_revs_output([
+                    ('refs/pull/410/head', '9118f4ab71963d23d02d4bdc54876ac8bf05acf2')
+                ])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '9118f4ab71963d23d02d4bdc54876ac8bf05acf2',
                 '^bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5',
                 '^fa3ae8ed68e664d4db24798611b352e3c6509930',
                 '--',
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'\n'.join([b'9118f4ab71963d23d02d4bdc54876ac8bf05acf2'])),
+            .stdout(self.commit_records_output(['9118f4ab71963d23d02d4bdc54876ac8bf05acf2'])),
         )
 
-        # and patch out the _get_commit_foo methods which were already tested
-        # above
-        def timestamp(rev):
-            return defer.succeed(1273258009)
-
-        self.patch(self.poller, '_get_commit_timestamp', timestamp)
-
-        def author(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_author', author)
-
-        def committer(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_committer', committer)
-
-        def files(rev):
-            return defer.succeed(['/etc/' + rev[:3]])
-
-        self.patch(self.poller, '_get_commit_files', files)
-
-        def comments(rev):
-            return defer.succeed('hello!')
-
-        self.patch(self.poller, '_get_commit_comments', comments)
-
         def pullFilter(branch):
             """
             Note that this isn't useful in practice, because it will only
@@ -1530,63 +1860,43 @@ class TestGitPoller(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ])
             .workdir(self.POLLER_WORKDIR)
             .stdout(b'no interesting output'),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([('master', '4423cdbcbb89c14e50dd5f4152415afd686c5241')])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^fa3ae8ed68e664d4db24798611b352e3c6509930',
                 '--',
             ])
             .workdir(self.POLLER_WORKDIR)
             .stdout(
-                b'\n'.join([
-                    b'64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
-                    b'4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                self.commit_records_output([
+                    '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                    '64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
                 ])
             ),
         )
 
-        # and patch out the _get_commit_foo methods which were already tested
-        # above
-        def timestamp(rev):
-            return defer.succeed(1273258009)
-
-        self.patch(self.poller, '_get_commit_timestamp', timestamp)
-
-        def author(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_author', author)
-
-        def committer(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_committer', committer)
-
-        def files(rev):
-            return defer.succeed(['/etc/' + rev[:3]])
-
-        self.patch(self.poller, '_get_commit_files', files)
-
-        def comments(rev):
-            return defer.succeed('hello!')
-
-        self.patch(self.poller, '_get_commit_comments', comments)
-
         # do the poll
         self.poller.lastRev = {'master': 'fa3ae8ed68e664d4db24798611b352e3c6509930'}
         self.poller.doPoll.running = True
@@ -1646,68 +1956,48 @@ class TestGitPoller(TestGitPollerBase):
         self.expect_commands(
             ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
             ExpectMasterShell(['git', 'init', '--bare', self.POLLER_WORKDIR]),
-            ExpectMasterShell(['git', 'ls-remote', '--refs', self.REPOURL]).stdout(
+            ExpectMasterShell(['git', 'ls-remote', '--refs', '--heads', self.REPOURL]).stdout(
                 b'4423cdbcbb89c14e50dd5f4152415afd686c5241\trefs/heads/master\n'
             ),
             ExpectMasterShell([
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'4423cdbcbb89c14e50dd5f4152415afd686c5241\n'),
+            .stdout(
+                self.tracker_revs_output([('master', '4423cdbcbb89c14e50dd5f4152415afd686c5241')])
+            ),
             ExpectMasterShell([
                 'git',
                 'log',
                 '--ignore-missing',
-                '--format=%H',
+                '--reverse',
+                '-z',
+                '--name-only',
+                self.LOG_RECORDS_FORMAT,
                 '4423cdbcbb89c14e50dd5f4152415afd686c5241',
                 '^fa3ae8ed68e664d4db24798611b352e3c6509930',
                 '--',
             ])
             .workdir(self.POLLER_WORKDIR)
             .stdout(
-                b'\n'.join([
-                    b'64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
-                    b'4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                self.commit_records_output([
+                    '4423cdbcbb89c14e50dd5f4152415afd686c5241',
+                    '64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
                 ])
             ),
         )
 
-        # and patch out the _get_commit_foo methods which were already tested
-        # above
-        def timestamp(rev):
-            return defer.succeed(1273258009)
-
-        self.patch(self.poller, '_get_commit_timestamp', timestamp)
-
-        def author(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_author', author)
-
-        def committer(rev):
-            return defer.succeed('by:' + rev[:8])
-
-        self.patch(self.poller, '_get_commit_committer', committer)
-
-        def files(rev):
-            return defer.succeed(['/etc/' + rev[:3]])
-
-        self.patch(self.poller, '_get_commit_files', files)
-
-        def comments(rev):
-            return defer.succeed('hello!')
-
-        self.patch(self.poller, '_get_commit_comments', comments)
-
         # do the poll
         self.poller.branches = True
 
@@ -1769,17 +2059,22 @@ class TestGitPoller(TestGitPollerBase):
         )
 
 
-class TestGitPollerWithSshPrivateKey(TestGitPollerBase):
+class TestGitPollerSshBase(TestGitPollerBase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        yield super().setUp()
+        self.temp_dir_mock = MockPrivateTemporaryDirectory()
+        self.patch(private_tempdir, 'PrivateTemporaryDirectory', self.temp_dir_mock)
+        self.write_local_file_mock = mock.Mock()
+        self.patch(gitpoller, 'writeLocalFile', self.write_local_file_mock)
+
+
+class TestGitPollerWithSshPrivateKey(TestGitPollerSshBase):
     def createPoller(self):
         return gitpoller.GitPoller(self.REPOURL, sshPrivateKey='ssh-key')
 
-    @mock.patch(
-        'buildbot.util.private_tempdir.PrivateTemporaryDirectory',
-        new_callable=MockPrivateTemporaryDirectory,
-    )
-    @mock.patch('buildbot.changes.gitpoller.writeLocalFile')
     @defer.inlineCallbacks
-    def test_check_git_features_ssh_1_7(self, write_local_file_mock, temp_dir_mock):
+    def test_check_git_features_ssh_1_7(self):
         self.expect_commands(
             ExpectMasterShell(['git', '--version']).stdout(b'git version 1.7.5\n'),
         )
@@ -1788,16 +2083,11 @@ class TestGitPollerWithSshPrivateKey(TestGitPollerBase):
 
         self.assert_all_commands_ran()
 
-        self.assertEqual(len(temp_dir_mock.dirs), 0)
-        write_local_file_mock.assert_not_called()
+        self.assertEqual(len(self.temp_dir_mock.dirs), 0)
+        self.write_local_file_mock.assert_not_called()
 
-    @mock.patch(
-        'buildbot.util.private_tempdir.PrivateTemporaryDirectory',
-        new_callable=MockPrivateTemporaryDirectory,
-    )
-    @mock.patch('buildbot.changes.gitpoller.writeLocalFile')
     @defer.inlineCallbacks
-    def test_poll_initial_2_10(self, write_local_file_mock, temp_dir_mock):
+    def test_poll_initial_2_10(self):
         key_path = os.path.join('basedir', 'gitpoller-work', '.buildbot-ssh@@@', 'ssh-key')
 
         self.expect_commands(
@@ -1817,16 +2107,20 @@ class TestGitPollerWithSshPrivateKey(TestGitPollerBase):
                 f'core.sshCommand=ssh -o "BatchMode=yes" -i "{key_path}"',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5\n'),
+            .stdout(
+                self.tracker_revs_output([('master', 'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5')])
+            ),
         )
 
         self.poller.doPoll.running = True
@@ -1843,16 +2137,11 @@ class TestGitPollerWithSshPrivateKey(TestGitPollerBase):
         )
 
         temp_dir_path = os.path.join('basedir', 'gitpoller-work', '.buildbot-ssh@@@')
-        self.assertEqual(temp_dir_mock.dirs, [(temp_dir_path, 0o700), (temp_dir_path, 0o700)])
-        write_local_file_mock.assert_called_with(key_path, 'ssh-key\n', mode=0o400)
-
-    @mock.patch(
-        'buildbot.util.private_tempdir.PrivateTemporaryDirectory',
-        new_callable=MockPrivateTemporaryDirectory,
-    )
-    @mock.patch('buildbot.changes.gitpoller.writeLocalFile')
+        self.assertEqual(self.temp_dir_mock.dirs, [(temp_dir_path, 0o700), (temp_dir_path, 0o700)])
+        self.write_local_file_mock.assert_called_with(key_path, 'ssh-key\n', mode=0o400)
+
     @defer.inlineCallbacks
-    def test_poll_initial_2_3(self, write_local_file_mock, temp_dir_mock):
+    def test_poll_initial_2_3(self):
         key_path = os.path.join('basedir', 'gitpoller-work', '.buildbot-ssh@@@', 'ssh-key')
 
         self.expect_commands(
@@ -1865,18 +2154,22 @@ class TestGitPollerWithSshPrivateKey(TestGitPollerBase):
                 'git',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ])
             .workdir(self.POLLER_WORKDIR)
             .env({'GIT_SSH_COMMAND': f'ssh -o "BatchMode=yes" -i "{key_path}"'}),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5\n'),
+            .stdout(
+                self.tracker_revs_output([('master', 'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5')])
+            ),
         )
 
         self.poller.doPoll.running = True
@@ -1893,16 +2186,11 @@ class TestGitPollerWithSshPrivateKey(TestGitPollerBase):
         )
 
         temp_dir_path = os.path.join('basedir', 'gitpoller-work', '.buildbot-ssh@@@')
-        self.assertEqual(temp_dir_mock.dirs, [(temp_dir_path, 0o700), (temp_dir_path, 0o700)])
-        write_local_file_mock.assert_called_with(key_path, 'ssh-key\n', mode=0o400)
-
-    @mock.patch(
-        'buildbot.util.private_tempdir.PrivateTemporaryDirectory',
-        new_callable=MockPrivateTemporaryDirectory,
-    )
-    @mock.patch('buildbot.changes.gitpoller.writeLocalFile')
+        self.assertEqual(self.temp_dir_mock.dirs, [(temp_dir_path, 0o700), (temp_dir_path, 0o700)])
+        self.write_local_file_mock.assert_called_with(key_path, 'ssh-key\n', mode=0o400)
+
     @defer.inlineCallbacks
-    def test_poll_failFetch_git_2_10(self, write_local_file_mock, temp_dir_mock):
+    def test_poll_failFetch_git_2_10(self):
         key_path = os.path.join('basedir', 'gitpoller-work', '.buildbot-ssh@@@', 'ssh-key')
 
         # make sure we cleanup the private key when fetch fails
@@ -1923,8 +2211,9 @@ class TestGitPollerWithSshPrivateKey(TestGitPollerBase):
                 f'core.sshCommand=ssh -o "BatchMode=yes" -i "{key_path}"',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ])
             .workdir(self.POLLER_WORKDIR)
             .exit(1),
@@ -1936,21 +2225,16 @@ class TestGitPollerWithSshPrivateKey(TestGitPollerBase):
         self.assert_all_commands_ran()
 
         temp_dir_path = os.path.join('basedir', 'gitpoller-work', '.buildbot-ssh@@@')
-        self.assertEqual(temp_dir_mock.dirs, [(temp_dir_path, 0o700), (temp_dir_path, 0o700)])
-        write_local_file_mock.assert_called_with(key_path, 'ssh-key\n', mode=0o400)
+        self.assertEqual(self.temp_dir_mock.dirs, [(temp_dir_path, 0o700), (temp_dir_path, 0o700)])
+        self.write_local_file_mock.assert_called_with(key_path, 'ssh-key\n', mode=0o400)
 
 
-class TestGitPollerWithSshHostKey(TestGitPollerBase):
+class TestGitPollerWithSshHostKey(TestGitPollerSshBase):
     def createPoller(self):
         return gitpoller.GitPoller(self.REPOURL, sshPrivateKey='ssh-key', sshHostKey='ssh-host-key')
 
-    @mock.patch(
-        'buildbot.util.private_tempdir.PrivateTemporaryDirectory',
-        new_callable=MockPrivateTemporaryDirectory,
-    )
-    @mock.patch('buildbot.changes.gitpoller.writeLocalFile')
     @defer.inlineCallbacks
-    def test_poll_initial_2_10(self, write_local_file_mock, temp_dir_mock):
+    def test_poll_initial_2_10(self):
         key_path = os.path.join('basedir', 'gitpoller-work', '.buildbot-ssh@@@', 'ssh-key')
         known_hosts_path = os.path.join(
             'basedir', 'gitpoller-work', '.buildbot-ssh@@@', 'ssh-known-hosts'
@@ -1975,16 +2259,20 @@ class TestGitPollerWithSshHostKey(TestGitPollerBase):
                 f'-o "UserKnownHostsFile={known_hosts_path}"',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5\n'),
+            .stdout(
+                self.tracker_revs_output([('master', 'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5')])
+            ),
         )
 
         self.poller.doPoll.running = True
@@ -2001,7 +2289,7 @@ class TestGitPollerWithSshHostKey(TestGitPollerBase):
         )
 
         temp_dir_path = os.path.join('basedir', 'gitpoller-work', '.buildbot-ssh@@@')
-        self.assertEqual(temp_dir_mock.dirs, [(temp_dir_path, 0o700), (temp_dir_path, 0o700)])
+        self.assertEqual(self.temp_dir_mock.dirs, [(temp_dir_path, 0o700), (temp_dir_path, 0o700)])
 
         expected_file_writes = [
             mock.call(key_path, 'ssh-key\n', mode=0o400),
@@ -2010,22 +2298,17 @@ class TestGitPollerWithSshHostKey(TestGitPollerBase):
             mock.call(known_hosts_path, '* ssh-host-key'),
         ]
 
-        self.assertEqual(expected_file_writes, write_local_file_mock.call_args_list)
+        self.assertEqual(expected_file_writes, self.write_local_file_mock.call_args_list)
 
 
-class TestGitPollerWithSshKnownHosts(TestGitPollerBase):
+class TestGitPollerWithSshKnownHosts(TestGitPollerSshBase):
     def createPoller(self):
         return gitpoller.GitPoller(
             self.REPOURL, sshPrivateKey='ssh-key\n', sshKnownHosts='ssh-known-hosts'
         )
 
-    @mock.patch(
-        'buildbot.util.private_tempdir.PrivateTemporaryDirectory',
-        new_callable=MockPrivateTemporaryDirectory,
-    )
-    @mock.patch('buildbot.changes.gitpoller.writeLocalFile')
     @defer.inlineCallbacks
-    def test_poll_initial_2_10(self, write_local_file_mock, temp_dir_mock):
+    def test_poll_initial_2_10(self):
         key_path = os.path.join('basedir', 'gitpoller-work', '.buildbot-ssh@@@', 'ssh-key')
         known_hosts_path = os.path.join(
             'basedir', 'gitpoller-work', '.buildbot-ssh@@@', 'ssh-known-hosts'
@@ -2050,16 +2333,20 @@ class TestGitPollerWithSshKnownHosts(TestGitPollerBase):
                 f'-o "UserKnownHostsFile={known_hosts_path}"',
                 'fetch',
                 '--progress',
+                '--no-tags',
                 self.REPOURL,
-                '+master:refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                f'+master:{self.REF_MASTER}',
             ]).workdir(self.POLLER_WORKDIR),
             ExpectMasterShell([
                 'git',
-                'rev-parse',
-                'refs/buildbot/' + self.REPOURL_QUOTED + '/master',
+                'for-each-ref',
+                '--format=%(objectname) %(refname)',
+                self.TRACKER_PREFIX,
             ])
             .workdir(self.POLLER_WORKDIR)
-            .stdout(b'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5\n'),
+            .stdout(
+                self.tracker_revs_output([('master', 'bf0b01df6d00ae8d1ffa0b2e2acbe642a6cd35d5')])
+            ),
         )
 
         self.poller.doPoll.running = True
@@ -2076,7 +2363,7 @@ class TestGitPollerWithSshKnownHosts(TestGitPollerBase):
         )
 
         temp_dir_path = os.path.join('basedir', 'gitpoller-work', '.buildbot-ssh@@@')
-        self.assertEqual(temp_dir_mock.dirs, [(temp_dir_path, 0o700), (temp_dir_path, 0o700)])
+        self.assertEqual(self.temp_dir_mock.dirs, [(temp_dir_path, 0o700), (temp_dir_path, 0o700)])
 
         expected_file_writes = [
             mock.call(key_path, 'ssh-key\n', mode=0o400),
@@ -2085,12 +2372,30 @@ class TestGitPollerWithSshKnownHosts(TestGitPollerBase):
             mock.call(known_hosts_path, 'ssh-known-hosts'),
         ]
 
-        self.assertEqual(expected_file_writes, write_local_file_mock.call_args_list)
+        self.assertEqual(expected_file_writes, self.write_local_file_mock.call_args_list)
 
 
-class TestGitPollerConstructor(
-    unittest.TestCase, TestReactorMixin, changesource.ChangeSourceMixin, config.ConfigErrorsMixin
-):
+class TestGitPollerConfigErrors(config.ConfigErrorsMixin, unittest.TestCase):
+    # checkConfig runs in the constructor, so no master is needed for these
+
+    def test_deprecatedFetchRefspec(self):
+        with self.assertRaisesConfigError("fetch_refspec is no longer supported"):
+            gitpoller.GitPoller("/tmp/git.git", fetch_refspec='not-supported')
+
+    def test_branches_andBranch(self):
+        with self.assertRaisesConfigError("can't specify both branch and branches"):
+            gitpoller.GitPoller("/tmp/git.git", branch='bad', branches=['listy'])
+
+    def test_branches_and_only_tags(self):
+        with self.assertRaisesConfigError("can't specify only_tags and branch/branches"):
+            gitpoller.GitPoller("/tmp/git.git", only_tags=True, branches=['listy'])
+
+    def test_branch_and_only_tags(self):
+        with self.assertRaisesConfigError("can't specify only_tags and branch/branches"):
+            gitpoller.GitPoller("/tmp/git.git", only_tags=True, branch='bad')
+
+
+class TestGitPollerConstructor(unittest.TestCase, TestReactorMixin, changesource.ChangeSourceMixin):
     @defer.inlineCallbacks
     def setUp(self):
         self.setup_test_reactor()
@@ -2102,13 +2407,6 @@ class TestGitPollerConstructor(
         yield self.master.stopService()
         yield self.tearDownChangeSource()
 
-    @defer.inlineCallbacks
-    def test_deprecatedFetchRefspec(self):
-        with self.assertRaisesConfigError("fetch_refspec is no longer supported"):
-            yield self.attachChangeSource(
-                gitpoller.GitPoller("/tmp/git.git", fetch_refspec='not-supported')
-            )
-
     @defer.inlineCallbacks
     def test_oldPollInterval(self):
         poller = yield self.attachChangeSource(gitpoller.GitPoller("/tmp/git.git", pollinterval=10))
@@ -2141,27 +2439,6 @@ class TestGitPollerConstructor(
         poller = yield self.attachChangeSource(gitpoller.GitPoller("/tmp/git.git", only_tags=True))
         self.assertIsNotNone(poller.branches)
 
-    @defer.inlineCallbacks
-    def test_branches_andBranch(self):
-        with self.assertRaisesConfigError("can't specify both branch and branches"):
-            yield self.attachChangeSource(
-                gitpoller.GitPoller("/tmp/git.git", branch='bad', branches=['listy'])
-            )
-
-    @defer.inlineCallbacks
-    def test_branches_and_only_tags(self):
-        with self.assertRaisesConfigError("can't specify only_tags and branch/branches"):
-            yield self.attachChangeSource(
-                gitpoller.GitPoller("/tmp/git.git", only_tags=True, branches=['listy'])
-            )
-
-    @defer.inlineCallbacks
-    def test_branch_and_only_tags(self):
-        with self.assertRaisesConfigError("can't specify only_tags and branch/branches"):
-            yield self.attachChangeSource(
-                gitpoller.GitPoller("/tmp/git.git", only_tags=True, branch='bad')
-            )
-
     @defer.inlineCallbacks
     def test_gitbin_default(self):
         poller = yield self.attachChangeSource(gitpoller.GitPoller("/tmp/git.git"))
@@ -134,6 +134,13 @@ class TestParseGitFeatures(GitMixin, unittest.TestCase):
         self.assertTrue(self.supportsSubmoduleCheckout)
         self.assertTrue(self.supportsSshPrivateKeyAsEnvOption)
         self.assertTrue(self.supportsSshPrivateKeyAsConfigOption)
+        self.assertFalse(self.supportsNoWriteFetchHead)
+
+    def test_git_2_29_0(self):
+        self.parseGitFeatures('git version 2.29.0')
+        self.assertTrue(self.gitInstalled)
+        self.assertTrue(self.supportsFilters)
+        self.assertTrue(self.supportsNoWriteFetchHead)
 
 
 class TestAdjustCommandParamsForSshPrivateKey(GitMixin, unittest.TestCase):
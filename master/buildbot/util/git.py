@@ -71,6 +71,7 @@ class GitMixin:
         self.supportsSshPrivateKeyAsEnvOption = False
         self.supportsSshPrivateKeyAsConfigOption = False
         self.supportsFilters = False
+        self.supportsNoWriteFetchHead = False
 
     def parseGitFeatures(self, version_stdout):
         match = re.match(r"^git version (\d+(\.\d+)*)", version_stdout)
@@ -94,6 +95,8 @@ class GitMixin:
             self.supportsSshPrivateKeyAsConfigOption = True
         if version >= parse_version("2.27.0"):
             self.supportsFilters = True
+        if version >= parse_version("2.29.0"):
+            self.supportsNoWriteFetchHead = True
 
     def adjustCommandParamsForSshPrivateKey(
         self, command, env, keyPath, sshWrapperPath=None, knownHostsPath=None
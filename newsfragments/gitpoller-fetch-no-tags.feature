@@ -0,0 +1 @@
+``GitPoller`` now fetches with ``--no-tags``, and with ``--no-write-fetch-head`` when git 2.29 or newer is installed.
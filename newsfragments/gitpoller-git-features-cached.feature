@@ -0,0 +1 @@
+``GitPoller`` no longer runs ``git --version`` on every poll and skips ``git init --bare`` when its working directory already contains a repository.
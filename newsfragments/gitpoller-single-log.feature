@@ -0,0 +1 @@
+``GitPoller`` now reads the details of all new commits of a branch with a single ``git log`` call instead of one call per commit.
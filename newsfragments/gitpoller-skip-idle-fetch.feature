@@ -0,0 +1 @@
+``GitPoller`` no longer fetches from the remote repository when ``git ls-remote`` shows that none of the polled branches changed since the previous poll.